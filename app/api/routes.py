@@ -2,16 +2,19 @@
 
 from __future__ import annotations
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Response
 
 from app.api.schemas import SessionCreateRequest
 from app.domain.generator import generate_session, get_meta, validate_temperament
 
 router = APIRouter(prefix="/api/v1", tags=["TonicEar"])
 
+META_CACHE_CONTROL = "public, max-age=300"
+
 
 @router.get("/meta")
-def get_metadata() -> dict:
+def get_metadata(response: Response) -> dict:
+    response.headers["Cache-Control"] = META_CACHE_CONTROL
     return get_meta()
 
 
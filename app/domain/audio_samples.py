@@ -2,6 +2,7 @@
 
 from __future__ import annotations
 
+from bisect import bisect_left
 from dataclasses import dataclass
 from functools import lru_cache
 from math import log2
@@ -106,6 +107,27 @@ def _sample_by_id(instrument: str = "piano") -> dict[str, SampleSpec]:
     return {spec.id: spec for spec in _sample_spec_tuple(instrument)}
 
 
+@lru_cache(maxsize=8)
+def _sample_hz_tuple(instrument: str = "piano") -> tuple[float, ...]:
+    return tuple(spec.hz for spec in _sample_spec_tuple(instrument))
+
+
+def _nearest_sample_for_hz(target_hz: float, instrument: str) -> SampleSpec:
+    # Specs ascend in pitch, so the nearest sample in cents is one of the two bracketing the target.
+    samples = _sample_spec_tuple(instrument)
+    index = bisect_left(_sample_hz_tuple(instrument), target_hz)
+    if index == 0:
+        return samples[0]
+    if index == len(samples):
+        return samples[-1]
+
+    lower = samples[index - 1]
+    upper = samples[index]
+    if abs(1200 * log2(target_hz / lower.hz)) <= abs(1200 * log2(target_hz / upper.hz)):
+        return lower
+    return upper
+
+
 def get_sample_for_midi(midi: int, instrument: str = "piano") -> SampleSpec:
     """Return nearest available sample spec for a MIDI note."""
 
@@ -133,27 +155,28 @@ def _dedupe_sorted_floats(values: list[float], tolerance: float = 1e-6) -> list[
     return unique
 
 
-def get_unique_equal_temperament_targets() -> list[float]:
-    """Return unique equal-temperament frequencies reachable in the app."""
-
+@lru_cache(maxsize=1)
+def _equal_temperament_target_tuple() -> tuple[float, ...]:
     frequencies: list[float] = []
     for gender in [item["id"] for item in GENDER_OPTIONS]:
         for key in [item["id"] for item in KEY_OPTIONS]:
             do_frequency = calculate_do_frequency(gender=gender, key_id=key)
             for semitone in range(12):
                 frequencies.append(note_frequency(semitone, do_frequency, EQUAL_TEMPERAMENT))
-    return _dedupe_sorted_floats(frequencies)
+    return tuple(_dedupe_sorted_floats(frequencies))
 
 
-def map_target_frequency(target_hz: float, instrument: str = "piano") -> FrequencyMapping:
-    """Map a target frequency to nearest raw sample (no playback-rate correction)."""
+def get_unique_equal_temperament_targets() -> list[float]:
+    """Return unique equal-temperament frequencies reachable in the app."""
 
+    return list(_equal_temperament_target_tuple())
+
+
+def _map_validated_target(target_hz: float, instrument: str) -> FrequencyMapping:
     if target_hz <= 0:
         raise ValueError(f"target_hz must be positive, got {target_hz}")
 
-    instrument = validate_instrument(instrument)
-    samples = _sample_spec_tuple(instrument)
-    sample = min(samples, key=lambda item: abs(1200 * log2(target_hz / item.hz)))
+    sample = _nearest_sample_for_hz(target_hz, instrument)
     cents_error = 1200 * log2(target_hz / sample.hz)
 
     return FrequencyMapping(
@@ -166,6 +189,19 @@ def map_target_frequency(target_hz: float, instrument: str = "piano") -> Frequen
     )
 
 
+def map_target_frequency(target_hz: float, instrument: str = "piano") -> FrequencyMapping:
+    """Map a target frequency to nearest raw sample (no playback-rate correction)."""
+
+    return _map_validated_target(target_hz, validate_instrument(instrument))
+
+
+def map_target_frequencies(targets: list[float], instrument: str = "piano") -> list[FrequencyMapping]:
+    """Map many target frequencies for one instrument, validating the instrument once."""
+
+    instrument = validate_instrument(instrument)
+    return [_map_validated_target(target, instrument) for target in targets]
+
+
 def worst_mapping_error(targets: list[float] | None = None, instrument: str = "piano") -> tuple[float, FrequencyMapping]:
     """Return worst absolute cents error for provided targets."""
 
@@ -174,6 +210,6 @@ def worst_mapping_error(targets: list[float] | None = None, instrument: str = "p
     if not checked_targets:
         raise ValueError("targets must not be empty")
 
-    mappings = [map_target_frequency(target, instrument=instrument) for target in checked_targets]
+    mappings = map_target_frequencies(checked_targets, instrument=instrument)
     worst = max(mappings, key=lambda mapping: abs(mapping.cents_error))
     return abs(worst.cents_error), worst
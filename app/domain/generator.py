@@ -5,6 +5,7 @@ from __future__ import annotations
 import random
 import uuid
 from dataclasses import dataclass
+from functools import lru_cache
 from itertools import combinations
 
 from app.domain.audio_samples import map_target_frequency, validate_instrument
@@ -113,8 +114,8 @@ MODULES = _build_modules()
 MODULE_MAP = {module.module_id: module for module in MODULES}
 
 
-def get_meta() -> dict:
-    """Public metadata for frontend configuration."""
+def _build_meta() -> dict:
+    """Materialize the public metadata dict from the static option tables."""
 
     return {
         "genders": GENDER_OPTIONS,
@@ -143,6 +144,15 @@ def get_meta() -> dict:
     }
 
 
+_META = _build_meta()
+
+
+def get_meta() -> dict:
+    """Public metadata for frontend configuration (built once at import; treat as read-only)."""
+
+    return _META
+
+
 def generate_session(
     module_id: str,
     gender: str,
@@ -161,15 +171,14 @@ def generate_session(
     effective_level = _resolve_note_pool_level(module)
     notes_pool = get_note_pool(effective_level)
     do_frequency = calculate_do_frequency(gender=gender, key_id=key)
+    payload_by_token = _build_pool_payloads(notes_pool, do_frequency, temperament, instrument)
 
     questions = [
         _generate_question(
             module=module,
             question_number=index + 1,
             notes_pool=notes_pool,
-            do_frequency=do_frequency,
-            temperament=temperament,
-            instrument=instrument,
+            payload_by_token=payload_by_token,
         )
         for index in range(QUESTION_COUNT)
     ]
@@ -206,21 +215,17 @@ def _resolve_note_pool_level(module: ModuleConfig) -> str:
 def _generate_question(
     module: ModuleConfig,
     question_number: int,
-    notes_pool: list,
-    do_frequency: float,
-    temperament: str,
-    instrument: str,
+    notes_pool: tuple,
+    payload_by_token: dict[str, dict],
 ) -> dict:
     if module.question_type == "compare_two":
-        return _generate_compare_two(module, question_number, notes_pool, do_frequency, temperament, instrument)
+        return _generate_compare_two(module, question_number, notes_pool, payload_by_token)
     if module.question_type == "sort_three":
         return _generate_sort(
             module,
             question_number,
             notes_pool,
-            do_frequency,
-            temperament,
-            instrument,
+            payload_by_token,
             note_count=3,
         )
     if module.question_type == "sort_four":
@@ -228,22 +233,20 @@ def _generate_question(
             module,
             question_number,
             notes_pool,
-            do_frequency,
-            temperament,
-            instrument,
+            payload_by_token,
             note_count=4,
         )
     if module.question_type == "interval_scale":
-        return _generate_interval(module, question_number, notes_pool, do_frequency, temperament, instrument)
+        return _generate_interval(module, question_number, notes_pool, payload_by_token)
     if module.question_type == "single_note":
-        return _generate_single_note(module, question_number, notes_pool, do_frequency, temperament, instrument)
+        return _generate_single_note(module, question_number, notes_pool, payload_by_token)
     raise ValueError(f"Unsupported question type '{module.question_type}'")
 
 
-def _generate_compare_two(module, question_number, notes_pool, do_frequency, temperament, instrument) -> dict:
+def _generate_compare_two(module, question_number, notes_pool, payload_by_token) -> dict:
     interval_step = _interval_constraint_for_level(module.level)
     picked = _pick_compare_notes(notes_pool, interval_step)
-    note_payloads = _build_note_payloads(picked, do_frequency, temperament, instrument)
+    note_payloads = _note_payloads(picked, payload_by_token)
 
     correct_answer = "first_higher" if picked[0].semitone > picked[1].semitone else "second_higher"
 
@@ -265,14 +268,12 @@ def _generate_sort(
     module,
     question_number,
     notes_pool,
-    do_frequency,
-    temperament,
-    instrument,
+    payload_by_token,
     note_count: int,
 ) -> dict:
     interval_step = _interval_constraint_for_level(module.level)
     picked = _pick_sort_notes(notes_pool, note_count, interval_step)
-    note_payloads = _build_note_payloads(picked, do_frequency, temperament, instrument)
+    note_payloads = _note_payloads(picked, payload_by_token)
     sorted_indices = sorted(range(note_count), key=lambda idx: picked[idx].semitone)
 
     return {
@@ -289,33 +290,25 @@ def _generate_sort(
     }
 
 
-def _generate_interval(module, question_number, notes_pool, do_frequency, temperament, instrument) -> dict:
+def _generate_interval(module, question_number, notes_pool, payload_by_token) -> dict:
     picked = random.sample(notes_pool, 2)
-    note_payloads = _build_note_payloads(picked, do_frequency, temperament, instrument)
+    note_payloads = _note_payloads(picked, payload_by_token)
     distance = abs(picked[0].degree - picked[1].degree)
 
-    possible_distances = sorted(
-        {
-            abs(a.degree - b.degree)
-            for a, b in combinations(notes_pool, 2)
-            if abs(a.degree - b.degree) > 0
-        }
-    )
-
     return {
         "id": f"{module.module_id}-Q{question_number}",
         "type": module.question_type,
         "notes": note_payloads,
         "visualHints": _build_visual_hints(picked),
-        "choices": [str(item) for item in possible_distances],
+        "choices": list(_degree_distance_choices(notes_pool)),
         "correctAnswer": str(distance),
         "promptText": "How many scale steps apart are these two notes?",
     }
 
 
-def _generate_single_note(module, question_number, notes_pool, do_frequency, temperament, instrument) -> dict:
+def _generate_single_note(module, question_number, notes_pool, payload_by_token) -> dict:
     picked = random.choice(notes_pool)
-    note_payload = _build_note_payloads([picked], do_frequency, temperament, instrument)[0]
+    note_payload = _note_payloads([picked], payload_by_token)[0]
 
     correct_answer = {
         "degree": str(picked.degree),
@@ -373,41 +366,61 @@ def _interval_constraint_for_level(level: str) -> int | None:
     return None
 
 
-def _pick_compare_notes(notes_pool: list, interval_step: int | None):
-    if interval_step is None:
-        return random.sample(notes_pool, 2)
+@lru_cache(maxsize=16)
+def _degree_distance_choices(notes_pool: tuple) -> tuple[str, ...]:
+    """Return the distinct non-zero scale-step distances between pool notes."""
+
+    distances = {abs(a.degree - b.degree) for a, b in combinations(notes_pool, 2)}
+    distances.discard(0)
+    return tuple(str(item) for item in sorted(distances))
+
 
-    valid_pairs = [
-        [left, right]
+@lru_cache(maxsize=16)
+def _interval_pairs(notes_pool: tuple, interval_step: int) -> tuple:
+    """Return pool note pairs exactly ``interval_step`` semitones apart."""
+
+    return tuple(
+        (left, right)
         for left, right in combinations(notes_pool, 2)
         if abs(left.semitone - right.semitone) == interval_step
-    ]
+    )
+
+
+@lru_cache(maxsize=16)
+def _interval_runs(notes_pool: tuple, note_count: int, interval_step: int) -> tuple:
+    """Return runs of ``note_count`` pool notes rising by ``interval_step`` semitones."""
+
+    note_by_semitone = {note.semitone: note for note in notes_pool}
+    runs = []
+    for start in sorted(note_by_semitone):
+        sequence = [start + interval_step * idx for idx in range(note_count)]
+        if all(semitone in note_by_semitone for semitone in sequence):
+            runs.append(tuple(note_by_semitone[semitone] for semitone in sequence))
+    return tuple(runs)
+
+
+def _pick_compare_notes(notes_pool: tuple, interval_step: int | None):
+    if interval_step is None:
+        return random.sample(notes_pool, 2)
+
+    valid_pairs = _interval_pairs(notes_pool, interval_step)
     if not valid_pairs:
         return random.sample(notes_pool, 2)
 
-    picked = random.choice(valid_pairs)
+    picked = list(random.choice(valid_pairs))
     random.shuffle(picked)
     return picked
 
 
-def _pick_sort_notes(notes_pool: list, note_count: int, interval_step: int | None):
+def _pick_sort_notes(notes_pool: tuple, note_count: int, interval_step: int | None):
     if interval_step is None:
         return random.sample(notes_pool, note_count)
 
-    note_by_semitone = {note.semitone: note for note in notes_pool}
-    semitone_values = sorted(note_by_semitone.keys())
-    valid_sequences = []
-
-    for start in semitone_values:
-        sequence = [start + interval_step * idx for idx in range(note_count)]
-        if all(semitone in note_by_semitone for semitone in sequence):
-            valid_sequences.append(sequence)
-
-    if not valid_sequences:
+    valid_runs = _interval_runs(notes_pool, note_count, interval_step)
+    if not valid_runs:
         return random.sample(notes_pool, note_count)
 
-    selected_sequence = random.choice(valid_sequences)
-    picked = [note_by_semitone[semitone] for semitone in selected_sequence]
+    picked = list(random.choice(valid_runs))
     random.shuffle(picked)
     return picked
 
@@ -417,18 +430,32 @@ def validate_temperament(temperament: str) -> None:
         raise ValueError(f"Unknown temperament '{temperament}'")
 
 
-def _build_note_payloads(
-    notes_pool: list,
+def _build_pool_payloads(
+    notes_pool: tuple,
     do_frequency: float,
     temperament: str,
     instrument: str,
-) -> list[dict]:
-    payloads: list[dict] = []
+) -> dict[str, dict]:
+    """Build each pool note's payload and sample mapping once per session."""
+
+    payload_by_token: dict[str, dict] = {}
     for note in notes_pool:
         payload = build_note_payload(note, do_frequency, temperament)
         frequency = note_frequency(note.semitone, do_frequency, temperament)
         mapping = map_target_frequency(frequency, instrument=instrument)
         payload["sampleId"] = mapping.sample_id
         payload["midi"] = mapping.midi
+        payload_by_token[note.token] = payload
+    return payload_by_token
+
+
+def _note_payloads(notes: list, payload_by_token: dict[str, dict]) -> list[dict]:
+    """Copy the prebuilt pool payloads so each question owns its note dicts."""
+
+    payloads: list[dict] = []
+    for note in notes:
+        payload = dict(payload_by_token[note.token])
+        if "enharmonic" in payload:
+            payload["enharmonic"] = dict(payload["enharmonic"])
         payloads.append(payload)
     return payloads
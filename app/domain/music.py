@@ -3,12 +3,17 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
+from functools import lru_cache
+from math import ldexp
 
 MALE_DO_C = 130.8
 FEMALE_DO_C = 261.6
 
 EQUAL_TEMPERAMENT = "equal_temperament"
 
+# One octave of equal-temperament ratios; other octaves are exact power-of-two scalings.
+_EQUAL_TEMPERAMENT_RATIOS = tuple(2 ** (step / 12) for step in range(12))
+
 TEMPERAMENT_OPTIONS = [
     {"id": EQUAL_TEMPERAMENT, "label": "Equal"},
 ]
@@ -37,6 +42,12 @@ GENDER_OPTIONS = [
 
 GENDER_BASE_DO = {"male": MALE_DO_C, "female": FEMALE_DO_C}
 
+_DO_FREQUENCIES = {
+    (gender, key_id): base_do * (2 ** (semitone_shift / 12))
+    for gender, base_do in GENDER_BASE_DO.items()
+    for key_id, semitone_shift in KEY_OFFSETS.items()
+}
+
 @dataclass(frozen=True)
 class NoteDefinition:
     """Single note entry in a movable-do system."""
@@ -155,9 +166,7 @@ def calculate_do_frequency(gender: str, key_id: str) -> float:
     if key_id not in KEY_OFFSETS:
         raise ValueError(f"Unknown key '{key_id}'")
 
-    base_do = GENDER_BASE_DO[gender]
-    semitone_shift = KEY_OFFSETS[key_id]
-    return base_do * (2 ** (semitone_shift / 12))
+    return _DO_FREQUENCIES[(gender, key_id)]
 
 
 def note_frequency(semitone: int, do_frequency: float, temperament: str) -> float:
@@ -165,16 +174,18 @@ def note_frequency(semitone: int, do_frequency: float, temperament: str) -> floa
 
     if temperament != EQUAL_TEMPERAMENT:
         raise ValueError(f"Unsupported temperament '{temperament}'")
-    return do_frequency * (2 ** (semitone / 12))
+    octave, step = divmod(semitone, 12)
+    return do_frequency * ldexp(_EQUAL_TEMPERAMENT_RATIOS[step], octave)
 
 
-def get_note_pool(level: str) -> list[NoteDefinition]:
+@lru_cache(maxsize=8)
+def get_note_pool(level: str) -> tuple[NoteDefinition, ...]:
     """Return note definitions for the requested difficulty level."""
 
     if level not in DIFFICULTY_LEVELS:
         raise ValueError(f"Unknown level '{level}'")
     tokens = DIFFICULTY_LEVELS[level]["tokens"]
-    return [NOTE_BY_TOKEN[token] for token in tokens]
+    return tuple(NOTE_BY_TOKEN[token] for token in tokens)
 
 
 def build_note_payload(note: NoteDefinition, do_frequency: float, temperament: str) -> dict:
@@ -0,0 +1,144 @@
+"""Helpers shared by the piano and guitar sample build scripts."""
+
+from __future__ import annotations
+
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+import hashlib
+import http.client
+import json
+import os
+from pathlib import Path
+import shutil
+import threading
+from urllib.parse import urlsplit
+from urllib.request import getproxies, proxy_bypass, urlretrieve
+
+DOWNLOAD_WORKERS = 8
+DOWNLOAD_TIMEOUT_SEC = 60
+DOWNLOAD_CHUNK_BYTES = 1 << 20
+
+_download_connections = threading.local()
+
+
+def require_tools(*names: str) -> None:
+    missing = [name for name in names if shutil.which(name) is None]
+    if missing:
+        raise SystemExit(f"Missing required tools in PATH: {', '.join(missing)}")
+
+
+@lru_cache(maxsize=None)
+def tool_path(name: str) -> str:
+    # subprocess only uses posix_spawn (no fork of this interpreter) when the
+    # executable has a directory component and close_fds=False.
+    return shutil.which(name) or name
+
+
+def scratch_dir_root() -> str | None:
+    # Prefer tmpfs for intermediate WAVs so render/measure/encode round-trips stay in RAM.
+    shm = Path("/dev/shm")
+    if shm.is_dir() and os.access(shm, os.W_OK):
+        return str(shm)
+    return None
+
+
+def keep_alive_connection(scheme: str, netloc: str, fresh: bool = False) -> http.client.HTTPConnection:
+    # One persistent connection per download thread and host, so N files cost one TCP/TLS handshake per worker.
+    connections = getattr(_download_connections, "by_host", None)
+    if connections is None:
+        connections = _download_connections.by_host = {}
+
+    key = (scheme, netloc)
+    connection = connections.get(key)
+    if fresh and connection is not None:
+        connection.close()
+        connection = None
+    if connection is None:
+        connection_class = http.client.HTTPSConnection if scheme == "https" else http.client.HTTPConnection
+        connection = connections[key] = connection_class(netloc, timeout=DOWNLOAD_TIMEOUT_SEC)
+    return connection
+
+
+def uses_proxy(scheme: str, host: str) -> bool:
+    return scheme in getproxies() and not proxy_bypass(host)
+
+
+def fetch_to_file(source_url: str, output_path: Path) -> None:
+    parts = urlsplit(source_url)
+    if parts.scheme not in ("http", "https") or uses_proxy(parts.scheme, parts.hostname or ""):
+        # urllib honours http_proxy/https_proxy/no_proxy; the keep-alive client talks to the host directly.
+        urlretrieve(source_url, output_path)
+        return
+
+    target = f"{parts.path}?{parts.query}" if parts.query else parts.path
+    for attempt in range(2):
+        connection = keep_alive_connection(parts.scheme, parts.netloc, fresh=attempt > 0)
+        try:
+            connection.request("GET", target)
+            response = connection.getresponse()
+        except (http.client.HTTPException, OSError):
+            # A stale keep-alive socket can surface as a reset, timeout or SSL error; retry once on a new one.
+            if attempt:
+                raise
+            continue
+
+        with response:
+            if response.status != 200:
+                response.read()
+                break
+            with output_path.open("wb") as handle:
+                shutil.copyfileobj(response, handle, DOWNLOAD_CHUNK_BYTES)
+            return
+
+    # Redirects and errors go through urllib, which follows redirects and raises HTTPError.
+    urlretrieve(source_url, output_path)
+
+
+def download_file(source_url: str, source_path: Path) -> None:
+    print(f"Downloading {source_url}")
+    # Fetch to a sibling .part file so an interrupted download never looks cached.
+    temp_path = source_path.with_name(f"{source_path.name}.part")
+    try:
+        fetch_to_file(source_url, temp_path)
+        os.replace(temp_path, source_path)
+    finally:
+        temp_path.unlink(missing_ok=True)
+
+
+def download_files(downloads: list[tuple[str, Path]]) -> None:
+    if not downloads:
+        return
+
+    with ThreadPoolExecutor(max_workers=min(DOWNLOAD_WORKERS, len(downloads))) as executor:
+        futures = [executor.submit(download_file, source_url, source_path) for source_url, source_path in downloads]
+        for future in futures:
+            future.result()
+
+
+def enforce_size_budget(output_dir: Path, target_mb: float, max_total_mb: float) -> tuple[int, float]:
+    with os.scandir(output_dir) as entries:
+        total_bytes = sum(entry.stat().st_size for entry in entries if entry.name.endswith(".m4a"))
+    total_mb = total_bytes / (1024 * 1024)
+
+    if total_mb > max_total_mb:
+        raise SystemExit(
+            f"Audio package is {total_mb:.2f}MB which exceeds hard cap {max_total_mb:.2f}MB",
+        )
+
+    if total_mb > target_mb:
+        print(
+            f"WARNING: audio package is {total_mb:.2f}MB, above target {target_mb:.2f}MB "
+            f"but within hard cap {max_total_mb:.2f}MB",
+        )
+
+    return total_bytes, total_mb
+
+
+def content_build_id(manifest: dict, audio_paths: list[Path]) -> int:
+    # Derived from what was built rather than when, so identical rebuilds keep the same cache-busting id.
+    digest = hashlib.blake2b(digest_size=6)
+    fields = {key: value for key, value in manifest.items() if key != "buildId"}
+    digest.update(json.dumps(fields, sort_keys=True).encode("utf-8"))
+    for path in audio_paths:
+        digest.update(path.read_bytes())
+    return int.from_bytes(digest.digest(), "big")
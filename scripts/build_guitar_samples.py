@@ -4,20 +4,23 @@
 from __future__ import annotations
 
 import argparse
-from array import array
+from bisect import bisect_left, bisect_right
 from dataclasses import dataclass
+from functools import lru_cache
 import json
 from math import exp, log, log2, log10, sqrt
 from pathlib import Path
 import re
 import shutil
 from statistics import median
+import struct
 import subprocess
 import sys
 import tempfile
-import time
+from typing import Iterator
 from urllib.parse import quote
-from urllib.request import urlretrieve
+
+import numpy as np
 
 REPO_ROOT = Path(__file__).resolve().parents[1]
 if str(REPO_ROOT) not in sys.path:
@@ -31,6 +34,14 @@ from app.domain.audio_samples import (  # noqa: E402
     get_unique_equal_temperament_targets,
     worst_mapping_error,
 )
+from _build_common import (  # noqa: E402
+    content_build_id,
+    download_files,
+    enforce_size_budget,
+    require_tools,
+    scratch_dir_root,
+    tool_path,
+)
 
 SOURCE_BASE_URL = "https://theremin.music.uiowa.edu/sound%20files/MIS/Piano_Other/guitar"
 RANGE_FILENAMES = [
@@ -74,6 +85,7 @@ START_PREROLL_SEC = 0.004
 TARGET_PEAK_LINEAR = 0.92
 GAIN_CLAMP_MIN = 0.35
 GAIN_CLAMP_MAX = 2.80
+AAC_CODER = "fast"
 ATTACK_ANALYSIS_SEC = 0.35
 MID_WINDOW_START_SEC = 0.35
 MID_WINDOW_DURATION_SEC = 0.55
@@ -109,9 +121,12 @@ NOTE_SEMITONES = {
     "Bb": 10,
     "B": 11,
 }
+NOTE_TOKEN_RE = re.compile(r"([A-G](?:b)?)(\d)")
+NOTE_TOKEN_SEARCH_RE = re.compile(r"[A-G][b]?\d")
+RANGE_FILENAME_RE = re.compile(r"\.([A-G][b]?\d(?:[A-G][b]?\d)?)\.mono\.aif$")
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class OnsetCandidate:
     midi: int
     source_filename: str
@@ -120,7 +135,7 @@ class OnsetCandidate:
     rms: float
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class NativeSelection:
     midi: int
     source_filename: str
@@ -147,19 +162,13 @@ def parse_args() -> argparse.Namespace:
     return parser.parse_args()
 
 
-def require_tools() -> None:
-    required = ["ffmpeg", "aubioonset", "aubiopitch"]
-    missing = [tool for tool in required if shutil.which(tool) is None]
-    if missing:
-        raise SystemExit(f"Missing required tools in PATH: {', '.join(missing)}")
-
-
 def source_url_for_filename(filename: str) -> str:
     return f"{SOURCE_BASE_URL}/{quote(filename)}"
 
 
+@lru_cache(maxsize=None)
 def note_to_midi(token: str) -> int:
-    match = re.fullmatch(r"([A-G](?:b)?)(\d)", token)
+    match = NOTE_TOKEN_RE.fullmatch(token)
     if not match:
         raise ValueError(f"Invalid note token '{token}'")
     note_name, octave_str = match.groups()
@@ -167,15 +176,16 @@ def note_to_midi(token: str) -> int:
     return (octave + 1) * 12 + NOTE_SEMITONES[note_name]
 
 
-def parse_filename_expected_midis(filename: str) -> list[int]:
-    match = re.search(r"\.([A-G][b]?\d(?:[A-G][b]?\d)?)\.mono\.aif$", filename)
+@lru_cache(maxsize=None)
+def parse_filename_expected_midis(filename: str) -> tuple[int, ...]:
+    match = RANGE_FILENAME_RE.search(filename)
     if not match:
         raise ValueError(f"Cannot parse note range from '{filename}'")
 
-    tokens = re.findall(r"[A-G][b]?\d", match.group(1))
+    tokens = NOTE_TOKEN_SEARCH_RE.findall(match.group(1))
     if len(tokens) == 1:
         value = note_to_midi(tokens[0])
-        return [value]
+        return (value,)
     if len(tokens) != 2:
         raise ValueError(f"Cannot parse note range from '{filename}'")
 
@@ -183,12 +193,13 @@ def parse_filename_expected_midis(filename: str) -> list[int]:
     hi = note_to_midi(tokens[1])
     if lo > hi:
         lo, hi = hi, lo
-    return list(range(lo, hi + 1))
+    return tuple(range(lo, hi + 1))
 
 
 def download_sources(cache_dir: Path, refresh_sources: bool) -> None:
     cache_dir.mkdir(parents=True, exist_ok=True)
 
+    pending: list[tuple[str, Path]] = []
     for filename in RANGE_FILENAMES:
         source_path = cache_dir / filename
         if refresh_sources and source_path.exists():
@@ -197,14 +208,14 @@ def download_sources(cache_dir: Path, refresh_sources: bool) -> None:
         if source_path.exists():
             continue
 
-        source_url = source_url_for_filename(filename)
-        print(f"Downloading {source_url}")
-        urlretrieve(source_url, source_path)
+        pending.append((source_url_for_filename(filename), source_path))
 
+    download_files(pending)
 
-def decode_mono_float_samples(input_path: Path, sample_rate: int) -> array:
-    ffmpeg_cmd = [
-        "ffmpeg",
+
+def mono_float_decode_cmd(input_path: Path, sample_rate: int) -> list[str]:
+    return [
+        tool_path("ffmpeg"),
         "-hide_banner",
         "-loglevel",
         "error",
@@ -219,15 +230,135 @@ def decode_mono_float_samples(input_path: Path, sample_rate: int) -> array:
         "f32le",
         "-",
     ]
-    proc = subprocess.run(ffmpeg_cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
-    samples = array("f")
-    samples.frombytes(proc.stdout)
-    return samples
+
+
+def read_mono_pcm_aiff(input_path: Path) -> tuple[np.ndarray, int] | None:
+    raw = input_path.read_bytes()
+    if raw[:4] != b"FORM" or raw[8:12] != b"AIFF":
+        return None
+
+    comm: tuple[int, int, int] | None = None
+    offset = 12
+    while offset + 8 <= len(raw):
+        chunk_id, chunk_size = struct.unpack_from(">4sI", raw, offset)
+        body = offset + 8
+        if chunk_id == b"COMM":
+            channels, _, bits, exponent, mantissa = struct.unpack_from(">hIhHQ", raw, body)
+            # 80-bit IEEE extended sample rate: 15-bit biased exponent plus 64-bit mantissa.
+            rate = mantissa * 2.0 ** ((exponent & 0x7FFF) - 16383 - 63)
+            comm = (channels, bits, int(round(rate)))
+        elif chunk_id == b"SSND":
+            if comm is None or comm[0] != 1 or comm[1] not in (16, 24, 32):
+                return None
+            data_offset = struct.unpack_from(">I", raw, body)[0]
+            start = body + 8 + data_offset
+            data = raw[start : min(body + chunk_size, len(raw))]
+            bits = comm[1]
+            if bits == 24:
+                frames = np.frombuffer(data, dtype=np.uint8, count=len(data) // 3 * 3).reshape(-1, 3)
+                # Widen each big-endian 24-bit frame into the top of an int32, as ffmpeg's s24 decoder does.
+                values = (
+                    (frames[:, 0].astype(np.int32) << 24)
+                    | (frames[:, 1].astype(np.int32) << 16)
+                    | (frames[:, 2].astype(np.int32) << 8)
+                )
+                scale = 2.0**31
+            else:
+                dtype = ">i2" if bits == 16 else ">i4"
+                width = bits // 8
+                values = np.frombuffer(data, dtype=dtype, count=len(data) // width)
+                scale = 2.0 ** (bits - 1)
+            return (values * np.float32(1.0 / scale)).astype(np.float32), comm[2]
+        offset = body + chunk_size + (chunk_size & 1)
+
+    return None
+
+
+def decode_mono_float_samples(input_path: Path, sample_rate: int) -> np.ndarray:
+    if input_path.suffix in (".aif", ".aiff"):
+        # The MIS guitar sources are mono integer PCM AIFF; skip the ffmpeg spawn when no resample is needed.
+        decoded = read_mono_pcm_aiff(input_path)
+        if decoded is not None and decoded[1] == sample_rate:
+            return decoded[0]
+
+    ffmpeg_cmd = mono_float_decode_cmd(input_path, sample_rate)
+    proc = subprocess.run(
+        ffmpeg_cmd,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        check=True,
+        close_fds=False,
+    )
+    return np.frombuffer(proc.stdout, dtype="<f4", count=len(proc.stdout) // 4)
+
+
+def iter_mono_float_chunks(
+    input_path: Path,
+    sample_rate: int,
+    chunk_bytes: int = 1 << 16,
+) -> Iterator[np.ndarray]:
+    if input_path.suffix == ".wav":
+        # Temp WAVs are written by this script as mono pcm_f32le; read them in-process.
+        samples, input_rate = read_mono_float_wav(input_path)
+        if input_rate == sample_rate:
+            if samples.size:
+                yield samples
+            return
+
+    ffmpeg_cmd = mono_float_decode_cmd(input_path, sample_rate)
+    with subprocess.Popen(
+        ffmpeg_cmd,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        close_fds=False,
+    ) as proc:
+        while True:
+            chunk = proc.stdout.read(chunk_bytes)
+            if not chunk:
+                break
+            usable = len(chunk) - len(chunk) % 4
+            if usable:
+                yield np.frombuffer(chunk, dtype="<f4", count=usable // 4)
+        stderr = proc.stderr.read()
+        returncode = proc.wait()
+    if returncode != 0:
+        raise subprocess.CalledProcessError(returncode, ffmpeg_cmd, stderr=stderr)
+
+
+def sample_segment_bounds(start_sec: float, duration_sec: float, sample_rate: int) -> tuple[int, int]:
+    start = max(0, int(round(start_sec * sample_rate)))
+    return start, start + int(round(duration_sec * sample_rate))
+
+
+def stream_peak_and_segment_rms(
+    input_path: Path,
+    sample_rate: int,
+    segments: list[tuple[int, int | None]],
+) -> tuple[float, list[float]]:
+    peak = 0.0
+    energies = [0.0] * len(segments)
+    counts = [0] * len(segments)
+    total_count = 0
+    for chunk in iter_mono_float_chunks(input_path, sample_rate=sample_rate):
+        chunk_start = total_count
+        total_count += chunk.size
+        peak = max(peak, float(np.abs(chunk).max()))
+
+        squared = np.square(chunk, dtype=np.float64)
+        for index, (start_index, end_index) in enumerate(segments):
+            lo = max(0, start_index - chunk_start)
+            hi = chunk.size if end_index is None else min(chunk.size, end_index - chunk_start)
+            if hi > lo:
+                energies[index] += float(squared[lo:hi].sum())
+                counts[index] += hi - lo
+
+    rms_values = [sqrt(energy / count) if count else 0.0 for energy, count in zip(energies, counts)]
+    return peak, rms_values
 
 
 def run_aubio_onsets(input_path: Path) -> list[float]:
     cmd = [
-        "aubioonset",
+        tool_path("aubioonset"),
         "-i",
         str(input_path),
         "-O",
@@ -237,22 +368,25 @@ def run_aubio_onsets(input_path: Path) -> list[float]:
         "-H",
         str(AUBIO_ONSET_HOP),
     ]
-    output = subprocess.check_output(cmd, text=True)
-    values = []
-    for line in output.splitlines():
-        line = line.strip()
-        if not line:
-            continue
-        try:
-            values.append(float(line))
-        except ValueError:
-            continue
+    values: list[float] = []
+    with subprocess.Popen(cmd, stdout=subprocess.PIPE, close_fds=False) as proc:
+        for line in proc.stdout:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                values.append(float(line))
+            except ValueError:
+                continue
+        returncode = proc.wait()
+    if returncode != 0:
+        raise subprocess.CalledProcessError(returncode, cmd)
     return values
 
 
 def run_aubio_pitch_midi(input_path: Path) -> list[tuple[float, float]]:
     cmd = [
-        "aubiopitch",
+        tool_path("aubiopitch"),
         "-i",
         str(input_path),
         "-p",
@@ -264,59 +398,62 @@ def run_aubio_pitch_midi(input_path: Path) -> list[tuple[float, float]]:
         "-H",
         str(AUBIO_PITCH_HOP),
     ]
-    output = subprocess.check_output(cmd, text=True)
     values: list[tuple[float, float]] = []
-    for line in output.splitlines():
-        parts = line.strip().split()
-        if len(parts) != 2:
-            continue
-        try:
-            timestamp = float(parts[0])
-            frequency = float(parts[1])
-        except ValueError:
-            continue
-        if frequency <= 40 or frequency >= 2000:
-            continue
-        midi = 69 + 12 * log2(frequency / 440.0)
-        values.append((timestamp, midi))
+    # Parse the pitch track as it streams; float() reads ASCII bytes, so lines are never decoded to str.
+    with subprocess.Popen(cmd, stdout=subprocess.PIPE, close_fds=False) as proc:
+        for line in proc.stdout:
+            parts = line.split()
+            if len(parts) != 2:
+                continue
+            try:
+                timestamp = float(parts[0])
+                frequency = float(parts[1])
+            except ValueError:
+                continue
+            if frequency <= 40 or frequency >= 2000:
+                continue
+            midi = 69 + 12 * log2(frequency / 440.0)
+            values.append((timestamp, midi))
+        returncode = proc.wait()
+    if returncode != 0:
+        raise subprocess.CalledProcessError(returncode, cmd)
     return values
 
 
-def window_rms(samples: array, sample_rate: int, start_sec: float, duration_sec: float) -> float:
+def window_rms(samples: np.ndarray, sample_rate: int, start_sec: float, duration_sec: float) -> float:
     start = max(0, int(round(start_sec * sample_rate)))
     end = min(len(samples), start + int(round(duration_sec * sample_rate)))
     if end <= start:
         return 0.0
 
-    energy = 0.0
-    count = 0
-    for index in range(start, end):
-        value = samples[index]
-        energy += value * value
-        count += 1
-
-    if count == 0:
-        return 0.0
-    return sqrt(energy / count)
+    window = samples[start:end].astype(np.float64)
+    return sqrt(float(window @ window) / window.size)
 
 
 def detect_candidates_for_file(
     source_path: Path,
     source_filename: str,
-    expected_midis: list[int],
+    expected_midis: tuple[int, ...],
     sample_rate: int,
 ) -> dict[int, OnsetCandidate]:
-    onsets = run_aubio_onsets(source_path)
-    pitch_track = run_aubio_pitch_midi(source_path)
+    onsets = sorted(run_aubio_onsets(source_path))
+    pitch_track = sorted(run_aubio_pitch_midi(source_path))
     decoded = decode_mono_float_samples(source_path, sample_rate=sample_rate)
 
     candidates: list[OnsetCandidate] = []
+    # Onsets and pitch frames are both time-ordered, so the pitch window only
+    # ever slides forward: sweep it with two pointers instead of rescanning.
+    window_lo = 0
+    window_hi = 0
     for onset in onsets:
-        midi_points = [
-            midi
-            for timestamp, midi in pitch_track
-            if onset + PITCH_WINDOW_START_SEC <= timestamp <= onset + PITCH_WINDOW_END_SEC
-        ]
+        window_start = onset + PITCH_WINDOW_START_SEC
+        window_end = onset + PITCH_WINDOW_END_SEC
+        while window_lo < len(pitch_track) and pitch_track[window_lo][0] < window_start:
+            window_lo += 1
+        window_hi = max(window_hi, window_lo)
+        while window_hi < len(pitch_track) and pitch_track[window_hi][0] <= window_end:
+            window_hi += 1
+        midi_points = [midi for _, midi in pitch_track[window_lo:window_hi]]
         if len(midi_points) < 5:
             continue
 
@@ -486,13 +623,17 @@ def render_fixed_duration_wav(
     sample_rate: int,
 ) -> None:
     start_sec = max(0.0, start_sec)
-    end_sec = start_sec + duration
+    # Input-side -ss/-t make the demuxer seek straight to the slice instead of decoding from 0.
     ffmpeg_cmd = [
-        "ffmpeg",
+        tool_path("ffmpeg"),
         "-hide_banner",
         "-loglevel",
         "error",
         "-y",
+        "-ss",
+        f"{start_sec:.6f}",
+        "-t",
+        f"{duration:.6f}",
         "-i",
         str(input_path),
         "-vn",
@@ -501,54 +642,108 @@ def render_fixed_duration_wav(
         "-ar",
         str(sample_rate),
         "-af",
-        (
-            f"atrim=start={start_sec:.6f}:end={end_sec:.6f},"
-            "asetpts=PTS-STARTPTS,"
-            f"apad=pad_dur={duration:.6f},"
-            f"atrim=end={duration:.6f}"
-        ),
+        f"apad=pad_dur={duration:.6f},atrim=end={duration:.6f}",
         "-c:a",
         "pcm_f32le",
         str(output_path),
     ]
-    subprocess.run(ffmpeg_cmd, check=True)
+    subprocess.run(ffmpeg_cmd, check=True, close_fds=False)
+
+
+def read_mono_float_wav(input_path: Path) -> tuple[np.ndarray, int]:
+    raw = input_path.read_bytes()
+    if raw[:4] != b"RIFF" or raw[8:12] != b"WAVE":
+        raise ValueError(f"Not a RIFF/WAVE file: {input_path}")
+
+    wav_format: tuple[int, int, int, int] | None = None
+    offset = 12
+    while offset + 8 <= len(raw):
+        chunk_id, chunk_size = struct.unpack_from("<4sI", raw, offset)
+        body = offset + 8
+        if chunk_id == b"fmt ":
+            format_tag, channels, rate = struct.unpack_from("<HHI", raw, body)
+            bits = struct.unpack_from("<H", raw, body + 14)[0]
+            if format_tag == 0xFFFE:
+                # WAVE_FORMAT_EXTENSIBLE keeps the real format tag in the sub-format GUID.
+                format_tag = struct.unpack_from("<H", raw, body + 24)[0]
+            wav_format = (format_tag, channels, rate, bits)
+        elif chunk_id == b"data":
+            if wav_format is None or wav_format[0] != 3 or wav_format[1] != 1 or wav_format[3] != 32:
+                raise ValueError(f"Expected mono 32-bit float WAV: {input_path}")
+            count = min(chunk_size, len(raw) - body) // 4
+            return np.frombuffer(raw, dtype="<f4", count=count, offset=body), wav_format[2]
+        offset = body + chunk_size + (chunk_size & 1)
+
+    raise ValueError(f"Missing data chunk in WAV file: {input_path}")
+
+
+def write_mono_float_wav(output_path: Path, samples: np.ndarray, sample_rate: int) -> None:
+    data = np.asarray(samples, dtype="<f4").tobytes()
+    header = struct.pack(
+        "<4sI4s4sIHHIIHH4sI",
+        b"RIFF",
+        36 + len(data),
+        b"WAVE",
+        b"fmt ",
+        16,
+        3,
+        1,
+        sample_rate,
+        sample_rate * 4,
+        4,
+        32,
+        b"data",
+        len(data),
+    )
+    output_path.write_bytes(header + data)
+
+
+def pitch_shift_samples(samples: np.ndarray, ratios: list[float], output_length: int) -> list[np.ndarray]:
+    # Band-limited FFT resample (same result as asetrate+aresample). Zero-padding to
+    # twice the span keeps the circular wrap-around in silence instead of the note.
+    # The donor spectrum is computed once and shared by every target ratio.
+    padded_length = 2 * max(len(samples), int(np.ceil(output_length * max(ratios))))
+    donor_spectrum = np.fft.rfft(samples.astype(np.float64), n=padded_length)
+
+    outputs: list[np.ndarray] = []
+    for ratio in ratios:
+        resampled_length = max(1, int(round(padded_length / ratio)))
+        bins = resampled_length // 2 + 1
+        if bins <= donor_spectrum.size:
+            spectrum = donor_spectrum[:bins]
+        else:
+            spectrum = np.pad(donor_spectrum, (0, bins - donor_spectrum.size))
+        shifted = np.fft.irfft(spectrum, n=resampled_length) * (resampled_length / padded_length)
 
+        output = np.zeros(output_length, dtype=np.float32)
+        count = min(output_length, shifted.size)
+        output[:count] = shifted[:count]
+        outputs.append(output)
+    return outputs
 
-def pitch_shift_wav_to_midi(
+
+def pitch_shift_wav_to_midis(
     input_path: Path,
-    output_path: Path,
     source_midi: int,
-    target_midi: int,
+    outputs: dict[int, Path],
     duration: float,
     sample_rate: int,
 ) -> None:
-    ratio = 2 ** ((target_midi - source_midi) / 12)
-    ffmpeg_cmd = [
-        "ffmpeg",
-        "-hide_banner",
-        "-loglevel",
-        "error",
-        "-y",
-        "-i",
-        str(input_path),
-        "-vn",
-        "-ac",
-        "1",
-        "-ar",
-        str(sample_rate),
-        "-af",
-        (
-            f"asetrate={sample_rate * ratio:.8f},"
-            f"aresample={sample_rate},"
-            f"atrim=end={duration:.6f},"
-            f"apad=pad_dur={duration:.6f},"
-            f"atrim=end={duration:.6f}"
-        ),
-        "-c:a",
-        "pcm_f32le",
-        str(output_path),
-    ]
-    subprocess.run(ffmpeg_cmd, check=True)
+    if not outputs:
+        return
+
+    samples, input_rate = read_mono_float_wav(input_path)
+    if input_rate != sample_rate:
+        raise ValueError(f"Expected {sample_rate}Hz donor WAV, got {input_rate}Hz: {input_path}")
+
+    ratios = [2 ** ((target_midi - source_midi) / 12) for target_midi in outputs]
+    shifted_outputs = pitch_shift_samples(
+        samples,
+        ratios=ratios,
+        output_length=int(round(duration * sample_rate)),
+    )
+    for output_path, shifted in zip(outputs.values(), shifted_outputs):
+        write_mono_float_wav(output_path, shifted, sample_rate=sample_rate)
 
 
 def render_native_temp_wavs(
@@ -582,64 +777,29 @@ def render_edge_fill_temp_wavs(
     duration: float,
     sample_rate: int,
 ) -> None:
+    targets_by_source: dict[int, dict[int, Path]] = {}
     for target_midi, source_midi in FILL_EDGE_MAP.items():
         output_path = temp_paths[target_midi] if target_midi in temp_paths else None
         if output_path is None:
             output_path = temp_paths[source_midi].parent / f"m{target_midi:03d}.wav"
-        pitch_shift_wav_to_midi(
+        targets_by_source.setdefault(source_midi, {})[target_midi] = output_path
+
+    for source_midi, outputs in targets_by_source.items():
+        pitch_shift_wav_to_midis(
             input_path=temp_paths[source_midi],
-            output_path=output_path,
             source_midi=source_midi,
-            target_midi=target_midi,
+            outputs=outputs,
             duration=duration,
             sample_rate=sample_rate,
         )
-        temp_paths[target_midi] = output_path
-
-
-def measure_peak_and_window_rms(
-    input_path: Path,
-    sample_rate: int,
-    analysis_duration_sec: float | None = None,
-) -> tuple[float, float]:
-    samples = decode_mono_float_samples(input_path, sample_rate=sample_rate)
-    if not samples:
-        return 0.0, 0.0
-
-    peak = max(abs(value) for value in samples)
-
-    if analysis_duration_sec is None:
-        end_index = len(samples)
-    else:
-        end_index = min(len(samples), int(round(analysis_duration_sec * sample_rate)))
-    window = samples[:end_index] if end_index > 0 else samples
-    if not window:
-        return peak, 0.0
-
-    energy = 0.0
-    for value in window:
-        energy += value * value
-
-    rms = sqrt(energy / len(window))
-    return peak, rms
-
-
-def measure_window_rms_segment(
-    input_path: Path,
-    sample_rate: int,
-    start_sec: float,
-    duration_sec: float,
-) -> float:
-    samples = decode_mono_float_samples(input_path, sample_rate=sample_rate)
-    if not samples:
-        return 0.0
-    return window_rms(samples, sample_rate=sample_rate, start_sec=start_sec, duration_sec=duration_sec)
+        temp_paths.update(outputs)
 
 
 def collect_temp_rms_maps(
     temp_paths: dict[int, Path],
     sample_rate: int,
     duration: float,
+    level_cache: dict[int, tuple[float, list[float]]] | None = None,
 ) -> tuple[dict[str, float], dict[str, float], dict[str, float], dict[str, float], dict[str, float]]:
     peak_map: dict[str, float] = {}
     full_rms_map: dict[str, float] = {}
@@ -652,32 +812,30 @@ def collect_temp_rms_maps(
     mid_window_duration = min(max(0.05, MID_WINDOW_DURATION_SEC), max(0.05, duration - mid_window_start))
     tail_window_start = max(0.0, duration - TAIL_ANALYSIS_SEC)
     tail_window_duration = max(0.05, duration - tail_window_start)
+    full_window_end = int(round(duration * sample_rate))
+    # One decode per file feeds every window instead of one decode per window.
+    segments = [
+        (0, full_window_end if full_window_end > 0 else None),
+        sample_segment_bounds(0.0, attack_window_duration, sample_rate),
+        sample_segment_bounds(mid_window_start, mid_window_duration, sample_rate),
+        sample_segment_bounds(tail_window_start, tail_window_duration, sample_rate),
+    ]
     for spec in build_sample_specs("guitar"):
-        peak, full_rms = measure_peak_and_window_rms(
-            temp_paths[spec.midi],
-            sample_rate=sample_rate,
-            analysis_duration_sec=duration,
-        )
+        levels = level_cache.get(spec.midi) if level_cache is not None else None
+        if levels is None:
+            levels = stream_peak_and_segment_rms(
+                temp_paths[spec.midi],
+                sample_rate=sample_rate,
+                segments=segments,
+            )
+            if level_cache is not None:
+                level_cache[spec.midi] = levels
+        peak, (full_rms, attack_rms, mid_rms, tail_rms) = levels
         peak_map[spec.id] = peak
         full_rms_map[spec.id] = full_rms
-        attack_rms_map[spec.id] = measure_window_rms_segment(
-            temp_paths[spec.midi],
-            sample_rate=sample_rate,
-            start_sec=0.0,
-            duration_sec=attack_window_duration,
-        )
-        mid_rms_map[spec.id] = measure_window_rms_segment(
-            temp_paths[spec.midi],
-            sample_rate=sample_rate,
-            start_sec=mid_window_start,
-            duration_sec=mid_window_duration,
-        )
-        tail_rms_map[spec.id] = measure_window_rms_segment(
-            temp_paths[spec.midi],
-            sample_rate=sample_rate,
-            start_sec=tail_window_start,
-            duration_sec=tail_window_duration,
-        )
+        attack_rms_map[spec.id] = attack_rms
+        mid_rms_map[spec.id] = mid_rms
+        tail_rms_map[spec.id] = tail_rms
 
     return peak_map, full_rms_map, attack_rms_map, mid_rms_map, tail_rms_map
 
@@ -705,42 +863,47 @@ def repair_low_sustain_temp_wavs(
         tail = max(tail_rms_map.get(sample_id, 0.0), 0.0)
         return tail / attack
 
+    ordered_specs = sorted(build_sample_specs("guitar"), key=lambda spec: spec.midi)
+    ordered_midis = [spec.midi for spec in ordered_specs]
+    # Only notes rewritten by a repair need re-measuring on the next pass.
+    level_cache: dict[int, tuple[float, list[float]]] = {}
+
     for _ in range(SUSTAIN_REPAIR_MAX_PASSES):
         peak_map, full_rms_map, attack_rms_map, mid_rms_map, tail_rms_map = collect_temp_rms_maps(
             temp_paths=temp_paths,
             sample_rate=sample_rate,
             duration=duration,
+            level_cache=level_cache,
         )
-        repaired_any = False
-        for spec in build_sample_specs("guitar"):
+        ratio_map = {spec.id: sustain_ratio(spec.id) for spec in ordered_specs}
+        repairs_by_donor: dict[int, list[int]] = {}
+        for spec in ordered_specs:
             sid = spec.id
-            ratio = sustain_ratio(sid)
+            ratio = ratio_map[sid]
             if ratio >= SUSTAIN_RATIO_FLOOR:
                 continue
 
+            # Donors must sit within the semitone limit, so only that slice of the
+            # MIDI-ordered specs is ever scanned.
+            lo = bisect_left(ordered_midis, spec.midi - SUSTAIN_REPAIR_MAX_SEMITONES)
+            hi = bisect_right(ordered_midis, spec.midi + SUSTAIN_REPAIR_MAX_SEMITONES)
+            nearby_donors = [donor for donor in ordered_specs[lo:hi] if donor.midi != spec.midi]
+
             donor_candidates = []
-            for donor in build_sample_specs("guitar"):
-                if donor.midi == spec.midi:
-                    continue
-                donor_ratio = sustain_ratio(donor.id)
+            for donor in nearby_donors:
+                donor_ratio = ratio_map[donor.id]
                 semitone_distance = abs(donor.midi - spec.midi)
                 if donor_ratio < max(SUSTAIN_DONOR_RATIO, ratio * 1.35):
                     continue
-                if semitone_distance > SUSTAIN_REPAIR_MAX_SEMITONES:
-                    continue
                 attack_similarity = abs(log(max(attack_rms_map.get(donor.id, 1e-12), 1e-12) / max(attack_rms_map.get(sid, 1e-12), 1e-12)))
                 donor_candidates.append((semitone_distance, attack_similarity, -donor_ratio, donor))
 
             if not donor_candidates:
-                for donor in build_sample_specs("guitar"):
-                    if donor.midi == spec.midi:
-                        continue
-                    donor_ratio = sustain_ratio(donor.id)
+                for donor in nearby_donors:
+                    donor_ratio = ratio_map[donor.id]
                     semitone_distance = abs(donor.midi - spec.midi)
                     if donor_ratio <= ratio * 1.20:
                         continue
-                    if semitone_distance > SUSTAIN_REPAIR_MAX_SEMITONES:
-                        continue
                     attack_similarity = abs(
                         log(
                             max(attack_rms_map.get(donor.id, 1e-12), 1e-12)
@@ -754,18 +917,27 @@ def repair_low_sustain_temp_wavs(
 
             donor_candidates.sort()
             donor = donor_candidates[0][3]
-            repaired_any = True
-            pitch_shift_wav_to_midi(
-                input_path=temp_paths[donor.midi],
-                output_path=temp_paths[spec.midi],
-                source_midi=donor.midi,
-                target_midi=spec.midi,
+            repairs_by_donor.setdefault(donor.midi, []).append(spec.midi)
+
+        if not repairs_by_donor:
+            break
+
+        # Stage every shift first so each repair in this pass reads the same
+        # donor audio its pass-start measurements were taken from.
+        staged_paths: dict[int, Path] = {}
+        for donor_midi, target_midis in repairs_by_donor.items():
+            outputs = {midi: temp_paths[midi].with_suffix(".repair.wav") for midi in target_midis}
+            pitch_shift_wav_to_midis(
+                input_path=temp_paths[donor_midi],
+                source_midi=donor_midi,
+                outputs=outputs,
                 duration=duration,
                 sample_rate=sample_rate,
             )
-
-        if not repaired_any:
-            break
+            staged_paths.update(outputs)
+        for midi, staged_path in staged_paths.items():
+            staged_path.replace(temp_paths[midi])
+            level_cache.pop(midi, None)
 
     sustain_ratio_map = {
         spec.id: max(tail_rms_map.get(spec.id, 0.0), 0.0) / max(attack_rms_map.get(spec.id, 1e-12), 1e-12)
@@ -904,7 +1076,7 @@ def compute_gain_map_from_blended_rms(
 
 def encode_final_sample(temp_wav_path: Path, output_path: Path, bitrate: str, gain: float) -> None:
     ffmpeg_cmd = [
-        "ffmpeg",
+        tool_path("ffmpeg"),
         "-hide_banner",
         "-loglevel",
         "error",
@@ -915,13 +1087,15 @@ def encode_final_sample(temp_wav_path: Path, output_path: Path, bitrate: str, ga
         f"volume={gain:.8f}",
         "-c:a",
         "aac",
+        "-aac_coder",
+        AAC_CODER,
         "-b:a",
         bitrate,
         "-movflags",
         "+faststart",
         str(output_path),
     ]
-    subprocess.run(ffmpeg_cmd, check=True)
+    subprocess.run(ffmpeg_cmd, check=True, close_fds=False)
 
 
 def collect_output_rms_maps(
@@ -1043,7 +1217,7 @@ def build_audio_assets(
     target_rms = 0.0
     global_peak_scale = 1.0
 
-    with tempfile.TemporaryDirectory(prefix="tonic_ear_guitar_") as temp_dir_str:
+    with tempfile.TemporaryDirectory(prefix="tonic_ear_guitar_", dir=scratch_dir_root()) as temp_dir_str:
         temp_dir = Path(temp_dir_str)
 
         temp_paths = render_native_temp_wavs(
@@ -1143,11 +1317,13 @@ def write_manifest(
     tail_rms_values = [value for value in tail_rms_map.values() if value > 0]
     sustain_values = [value for value in sustain_ratio_map.values() if value > 0]
     gain_values = [value for value in gain_map.values() if value > 0]
+    duration_ms = int(round(duration * 1000))
+    quality_spread_method = f"p{int(QUALITY_SPREAD_LOW_PERCENTILE * 100)}_p{int(QUALITY_SPREAD_HIGH_PERCENTILE * 100)}"
     quality = {
         "spreadMethod": {
-            "fullRms": f"p{int(QUALITY_SPREAD_LOW_PERCENTILE * 100)}_p{int(QUALITY_SPREAD_HIGH_PERCENTILE * 100)}",
-            "attackRms": f"p{int(QUALITY_SPREAD_LOW_PERCENTILE * 100)}_p{int(QUALITY_SPREAD_HIGH_PERCENTILE * 100)}",
-            "midRms": f"p{int(QUALITY_SPREAD_LOW_PERCENTILE * 100)}_p{int(QUALITY_SPREAD_HIGH_PERCENTILE * 100)}",
+            "fullRms": quality_spread_method,
+            "attackRms": quality_spread_method,
+            "midRms": quality_spread_method,
             "sustainRatio": f"p{int(SUSTAIN_SPREAD_LOW_PERCENTILE * 100)}_p{int(SUSTAIN_SPREAD_HIGH_PERCENTILE * 100)}",
         },
         "fullRmsSpreadDb": round(
@@ -1187,11 +1363,11 @@ def write_manifest(
     manifest = {
         "version": 1,
         "instrument": "guitar",
-        "buildId": int(time.time()),
+        "buildId": 0,
         "source": "University of Iowa MIS Guitar (ff mono ranges)",
         "sourceUrl": SOURCE_BASE_URL,
         "sourceFiles": RANGE_FILENAMES,
-        "durationMs": int(round(duration * 1000)),
+        "durationMs": duration_ms,
         "sampleRate": sample_rate,
         "codec": "aac",
         "bitrate": bitrate,
@@ -1209,7 +1385,7 @@ def write_manifest(
             "targetPeakLinear": TARGET_PEAK_LINEAR,
             "globalPeakScale": round(global_peak_scale, 8),
             "peakRange": [round(min(peak_values), 6), round(max(peak_values), 6)] if peak_values else [0.0, 0.0],
-            "fullWindowRmsMs": int(round(duration * 1000)),
+            "fullWindowRmsMs": duration_ms,
             "fullWindowRmsRange": [round(min(full_rms_values), 8), round(max(full_rms_values), 8)]
             if full_rms_values
             else [0.0, 0.0],
@@ -1264,7 +1440,7 @@ def write_manifest(
                 "midi": spec.midi,
                 "note": spec.note,
                 "hz": round(spec.hz, 6),
-                "durationMs": int(round(duration * 1000)),
+                "durationMs": duration_ms,
                 "gainApplied": round(gain_map.get(spec.id, 1.0), 8),
                 "windowRms": round(full_rms_map.get(spec.id, 0.0), 8),
                 "attackRms": round(attack_rms_map.get(spec.id, 0.0), 8),
@@ -1277,32 +1453,16 @@ def write_manifest(
         ],
     }
 
-    (output_dir / "manifest.json").write_text(json.dumps(manifest, indent=2), encoding="utf-8")
-    return manifest
-
-
-def enforce_size_budget(output_dir: Path, target_mb: float, max_total_mb: float) -> tuple[int, float]:
-    audio_files = sorted(output_dir.glob("*.m4a"))
-    total_bytes = sum(path.stat().st_size for path in audio_files)
-    total_mb = total_bytes / (1024 * 1024)
+    manifest["buildId"] = content_build_id(manifest, [output_dir / spec.output_filename for spec in sample_specs])
 
-    if total_mb > max_total_mb:
-        raise SystemExit(
-            f"Audio package is {total_mb:.2f}MB which exceeds hard cap {max_total_mb:.2f}MB",
-        )
-
-    if total_mb > target_mb:
-        print(
-            f"WARNING: audio package is {total_mb:.2f}MB, above target {target_mb:.2f}MB "
-            f"but within hard cap {max_total_mb:.2f}MB",
-        )
-
-    return total_bytes, total_mb
+    with (output_dir / "manifest.json").open("w", encoding="utf-8") as handle:
+        json.dump(manifest, handle, indent=2)
+    return manifest
 
 
 def main() -> None:
     args = parse_args()
-    require_tools()
+    require_tools("ffmpeg", "aubioonset", "aubiopitch")
 
     output_dir = Path(args.output_dir)
     cache_dir = Path(args.cache_dir)
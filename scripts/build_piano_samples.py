@@ -4,18 +4,18 @@
 from __future__ import annotations
 
 import argparse
-from array import array
-from math import sqrt
+from concurrent.futures import ProcessPoolExecutor
+import hashlib
 import json
+import os
 from pathlib import Path
 import shutil
 from statistics import median
 import subprocess
 import sys
-import tempfile
-import time
 from urllib.parse import quote
-from urllib.request import urlretrieve
+
+import numpy as np
 
 REPO_ROOT = Path(__file__).resolve().parents[1]
 if str(REPO_ROOT) not in sys.path:
@@ -24,10 +24,12 @@ if str(REPO_ROOT) not in sys.path:
 from app.domain.audio_samples import (
     SAMPLE_MAX_HZ,
     SAMPLE_MIN_HZ,
+    SampleSpec,
     build_sample_specs,
     get_unique_equal_temperament_targets,
     worst_mapping_error,
 )
+from _build_common import content_build_id, download_files, enforce_size_budget, require_tools, tool_path
 
 SOURCE_BASE_URL = "https://theremin.music.uiowa.edu/sound%20files/MIS/Piano_Other/piano"
 
@@ -39,6 +41,12 @@ TARGET_PEAK_LINEAR = 0.90
 GAIN_CLAMP_MIN = 0.60
 GAIN_CLAMP_MAX = 3.00
 
+# The native encoder's default twoloop search is slow; fast is indistinguishable on short samples.
+AAC_CODER = "fast"
+
+BUILD_CACHE_FILENAME = "build-cache.json"
+TRIMMED_CACHE_DIRNAME = "trimmed"
+
 
 def parse_args() -> argparse.Namespace:
     parser = argparse.ArgumentParser(description=__doc__)
@@ -49,6 +57,13 @@ def parse_args() -> argparse.Namespace:
     parser.add_argument("--bitrate", default="160k", help="AAC bitrate, for example 128k/160k")
     parser.add_argument("--target-mb", type=float, default=10.0, help="Soft package-size target")
     parser.add_argument("--max-total-mb", type=float, default=20.0, help="Hard package-size cap")
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        # At least two workers so one sample's decode overlaps another's encode even on small machines.
+        default=max(2, (os.cpu_count() or 2) // 2),
+        help="Parallel worker processes for render/encode",
+    )
     parser.add_argument("--clean", action="store_true", help="Remove output dir before build")
     parser.add_argument(
         "--refresh-sources",
@@ -58,19 +73,15 @@ def parse_args() -> argparse.Namespace:
     return parser.parse_args()
 
 
-def require_ffmpeg() -> None:
-    if shutil.which("ffmpeg") is None:
-        raise SystemExit("ffmpeg is required but not found in PATH")
-
-
 def source_url_for_filename(filename: str) -> str:
     return f"{SOURCE_BASE_URL}/{quote(filename)}"
 
 
-def download_sources(cache_dir: Path, refresh_sources: bool) -> None:
+def download_sources(sample_specs: list[SampleSpec], cache_dir: Path, refresh_sources: bool) -> None:
     cache_dir.mkdir(parents=True, exist_ok=True)
 
-    for spec in build_sample_specs():
+    pending: list[tuple[str, Path]] = []
+    for spec in sample_specs:
         source_path = cache_dir / spec.source_filename
         if refresh_sources and source_path.exists():
             source_path.unlink()
@@ -78,41 +89,13 @@ def download_sources(cache_dir: Path, refresh_sources: bool) -> None:
         if source_path.exists():
             continue
 
-        source_url = source_url_for_filename(spec.source_filename)
-        print(f"Downloading {source_url}")
-        urlretrieve(source_url, source_path)
-
+        pending.append((source_url_for_filename(spec.source_filename), source_path))
 
-def decode_mono_float_samples(input_path: Path, sample_rate: int) -> array:
-    ffmpeg_cmd = [
-        "ffmpeg",
-        "-hide_banner",
-        "-loglevel",
-        "error",
-        "-i",
-        str(input_path),
-        "-vn",
-        "-ac",
-        "1",
-        "-ar",
-        str(sample_rate),
-        "-f",
-        "f32le",
-        "-",
-    ]
-    proc = subprocess.run(ffmpeg_cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
-    samples = array("f")
-    samples.frombytes(proc.stdout)
-    return samples
+    download_files(pending)
 
 
-def render_trimmed_wav(
-    input_path: Path,
-    temp_wav_path: Path,
-    duration: float,
-    sample_rate: int,
-) -> None:
-    filter_chain = ",".join(
+def trim_filter_chain(duration: float) -> str:
+    return ",".join(
         [
             (
                 "silenceremove="
@@ -127,12 +110,17 @@ def render_trimmed_wav(
         ]
     )
 
+
+def render_trimmed_samples(
+    input_path: Path,
+    duration: float,
+    sample_rate: int,
+) -> np.ndarray:
     ffmpeg_cmd = [
-        "ffmpeg",
+        tool_path("ffmpeg"),
         "-hide_banner",
         "-loglevel",
         "error",
-        "-y",
         "-i",
         str(input_path),
         "-vn",
@@ -141,108 +129,214 @@ def render_trimmed_wav(
         "-ar",
         str(sample_rate),
         "-af",
-        filter_chain,
-        "-c:a",
-        "pcm_f32le",
-        str(temp_wav_path),
+        trim_filter_chain(duration),
+        "-f",
+        "f32le",
+        "-",
     ]
-    subprocess.run(ffmpeg_cmd, check=True)
+    proc = subprocess.run(ffmpeg_cmd, stdout=subprocess.PIPE, check=True, close_fds=False)
+    return np.frombuffer(proc.stdout, dtype="<f4")
 
 
-def measure_peak_and_window_rms(input_path: Path, sample_rate: int) -> tuple[float, float]:
-    samples = decode_mono_float_samples(input_path, sample_rate=sample_rate)
-    if not samples:
+def measure_peak_and_window_rms(samples: np.ndarray, sample_rate: int) -> tuple[float, float]:
+    if samples.size == 0:
         return 0.0, 0.0
 
-    peak = max(abs(value) for value in samples)
+    # max/min reductions avoid materializing an abs() copy of the buffer.
+    peak = float(max(samples.max(), -samples.min()))
 
-    end_index = min(len(samples), int(round(RMS_WINDOW_SEC * sample_rate)))
+    end_index = min(samples.size, int(round(RMS_WINDOW_SEC * sample_rate)))
     window = samples[:end_index] if end_index > 0 else samples
-    if not window:
+    if window.size == 0:
         return peak, 0.0
 
-    energy = 0.0
-    for value in window:
-        energy += value * value
-
-    rms = sqrt(energy / len(window))
+    window = window.astype(np.float64)
+    rms = float(np.sqrt(np.dot(window, window) / window.size))
     return peak, rms
 
 
-def encode_final_sample(temp_wav_path: Path, output_path: Path, bitrate: str, gain: float) -> None:
+def peak_normalize_gain(peak: float) -> float:
+    if peak <= 0:
+        gain = 1.0
+    else:
+        gain = TARGET_PEAK_LINEAR / peak
+
+    return max(GAIN_CLAMP_MIN, min(GAIN_CLAMP_MAX, gain))
+
+
+def encode_final_sample(samples: np.ndarray, output_path: Path, sample_rate: int, bitrate: str) -> None:
     ffmpeg_cmd = [
-        "ffmpeg",
+        tool_path("ffmpeg"),
         "-hide_banner",
         "-loglevel",
         "error",
         "-y",
+        "-f",
+        "f32le",
+        "-ar",
+        str(sample_rate),
+        "-ac",
+        "1",
         "-i",
-        str(temp_wav_path),
-        "-af",
-        f"volume={gain:.8f}",
+        "-",
         "-c:a",
         "aac",
+        "-aac_coder",
+        AAC_CODER,
         "-b:a",
         bitrate,
         "-movflags",
         "+faststart",
         str(output_path),
     ]
-    subprocess.run(ffmpeg_cmd, check=True)
+    subprocess.run(ffmpeg_cmd, input=samples.astype("<f4").tobytes(), check=True, close_fds=False)
+
+
+def load_or_render_trimmed_samples(
+    input_path: Path,
+    trimmed_path: Path,
+    duration: float,
+    sample_rate: int,
+) -> np.ndarray:
+    if trimmed_path.exists():
+        return np.fromfile(trimmed_path, dtype="<f4")
+
+    samples = render_trimmed_samples(input_path, duration=duration, sample_rate=sample_rate)
+    trimmed_path.parent.mkdir(parents=True, exist_ok=True)
+    spec_id = trimmed_path.name.split(".", 1)[0]
+    for stale_path in trimmed_path.parent.glob(f"{spec_id}.*.f32"):
+        stale_path.unlink(missing_ok=True)
+    temp_path = trimmed_path.with_name(f"{trimmed_path.name}.tmp")
+    samples.tofile(temp_path)
+    os.replace(temp_path, trimmed_path)
+    return samples
+
+
+def build_sample(
+    input_path: Path,
+    trimmed_path: Path,
+    output_path: Path,
+    duration: float,
+    sample_rate: int,
+    bitrate: str,
+) -> tuple[float, float, float]:
+    # One trim decode feeds measurement, and the measured peak gain is applied before piping to the encoder.
+    samples = load_or_render_trimmed_samples(input_path, trimmed_path, duration=duration, sample_rate=sample_rate)
+    peak, rms = measure_peak_and_window_rms(samples, sample_rate=sample_rate)
+    gain = peak_normalize_gain(peak)
+    encode_final_sample(samples * np.float32(gain), output_path, sample_rate=sample_rate, bitrate=bitrate)
+    return peak, rms, gain
+
+
+def sample_build_keys(source_path: Path, duration: float, sample_rate: int, bitrate: str) -> tuple[str, str]:
+    with source_path.open("rb") as handle:
+        source_digest = hashlib.file_digest(handle, "sha256").hexdigest()
+
+    # The trim key covers only the decode, so encode-side changes such as bitrate reuse the trimmed PCM.
+    trim_key = hashlib.sha256(
+        f"{source_digest}|{trim_filter_chain(duration)}|{sample_rate}".encode("utf-8"),
+    ).hexdigest()
+    # Cached entries also carry the measured peak/RMS published in the manifest, so measurement settings count too.
+    encode_settings = "|".join(
+        [
+            bitrate,
+            AAC_CODER,
+            str(RMS_WINDOW_SEC),
+            str(TARGET_PEAK_LINEAR),
+            str(GAIN_CLAMP_MIN),
+            str(GAIN_CLAMP_MAX),
+        ]
+    )
+    build_key = hashlib.sha256(f"{trim_key}|{encode_settings}".encode("utf-8")).hexdigest()
+    return trim_key, build_key
+
+
+def load_build_cache(cache_path: Path) -> dict[str, dict]:
+    try:
+        cache = json.loads(cache_path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+    return cache if isinstance(cache, dict) else {}
+
+
+def save_build_cache(cache_path: Path, cache: dict[str, dict]) -> None:
+    temp_path = cache_path.with_name(f"{cache_path.name}.tmp")
+    temp_path.write_text(json.dumps(cache, indent=2, sort_keys=True), encoding="utf-8")
+    os.replace(temp_path, cache_path)
 
 
 def build_audio_assets(
+    sample_specs: list[SampleSpec],
     output_dir: Path,
     cache_dir: Path,
     duration: float,
     sample_rate: int,
     bitrate: str,
     refresh_sources: bool,
+    jobs: int,
 ) -> tuple[dict[str, float], dict[str, float], dict[str, float]]:
     output_dir.mkdir(parents=True, exist_ok=True)
-    download_sources(cache_dir, refresh_sources=refresh_sources)
+    download_sources(sample_specs, cache_dir, refresh_sources=refresh_sources)
 
     peak_map: dict[str, float] = {}
     rms_map: dict[str, float] = {}
     gain_map: dict[str, float] = {}
 
-    with tempfile.TemporaryDirectory(prefix="tonic_ear_samples_") as temp_dir_str:
-        temp_dir = Path(temp_dir_str)
-        temp_wavs: dict[str, Path] = {}
-
-        for spec in build_sample_specs():
-            source_path = cache_dir / spec.source_filename
-            temp_wav_path = temp_dir / f"{spec.id}.wav"
-
-            render_trimmed_wav(
-                source_path,
-                temp_wav_path,
-                duration=duration,
-                sample_rate=sample_rate,
-            )
-
-            peak, rms = measure_peak_and_window_rms(temp_wav_path, sample_rate=sample_rate)
-            peak_map[spec.id] = peak
-            rms_map[spec.id] = rms
-            temp_wavs[spec.id] = temp_wav_path
-
-        for spec in build_sample_specs():
-            peak = peak_map.get(spec.id, 0.0)
-            if peak <= 0:
-                gain = 1.0
-            else:
-                gain = TARGET_PEAK_LINEAR / peak
-
-            gain = max(GAIN_CLAMP_MIN, min(GAIN_CLAMP_MAX, gain))
-            gain_map[spec.id] = gain
-
-            output_path = output_dir / spec.output_filename
-            encode_final_sample(temp_wavs[spec.id], output_path, bitrate=bitrate, gain=gain)
+    # Kept next to the sources rather than in output_dir, which is published as-is.
+    cache_path = cache_dir / BUILD_CACHE_FILENAME
+    build_cache = load_build_cache(cache_path)
+    trim_keys: dict[str, str] = {}
+    build_keys: dict[str, str] = {}
+    pending_specs: list[SampleSpec] = []
+
+    for spec in sample_specs:
+        trim_key, build_key = sample_build_keys(cache_dir / spec.source_filename, duration, sample_rate, bitrate)
+        trim_keys[spec.id] = trim_key
+        build_keys[spec.id] = build_key
+        cached = build_cache.get(spec.id)
+        if isinstance(cached, dict) and cached.get("key") == build_key and (output_dir / spec.output_filename).exists():
+            peak_map[spec.id] = cached["peak"]
+            rms_map[spec.id] = cached["rms"]
+            gain_map[spec.id] = cached["gain"]
+        else:
+            pending_specs.append(spec)
+
+    if pending_specs:
+        print(f"Building {len(pending_specs)} of {len(sample_specs)} piano samples")
+
+        # Every sample is independent, so each spec is one task in the pool.
+        with ProcessPoolExecutor(max_workers=max(1, jobs)) as executor:
+            futures = {
+                spec.id: executor.submit(
+                    build_sample,
+                    cache_dir / spec.source_filename,
+                    cache_dir / TRIMMED_CACHE_DIRNAME / f"{spec.id}.{trim_keys[spec.id][:16]}.f32",
+                    output_dir / spec.output_filename,
+                    duration,
+                    sample_rate,
+                    bitrate,
+                )
+                for spec in pending_specs
+            }
+            for spec in pending_specs:
+                peak, rms, gain = futures[spec.id].result()
+                peak_map[spec.id] = peak
+                rms_map[spec.id] = rms
+                gain_map[spec.id] = gain
+                build_cache[spec.id] = {
+                    "key": build_keys[spec.id],
+                    "peak": peak,
+                    "rms": rms,
+                    "gain": gain,
+                }
+
+        save_build_cache(cache_path, build_cache)
 
     return peak_map, rms_map, gain_map
 
 
 def write_manifest(
+    sample_specs: list[SampleSpec],
     output_dir: Path,
     duration: float,
     sample_rate: int,
@@ -251,9 +345,9 @@ def write_manifest(
     rms_map: dict[str, float],
     gain_map: dict[str, float],
 ) -> dict:
-    sample_specs = build_sample_specs()
     equal_targets = get_unique_equal_temperament_targets()
     max_error_cents, worst = worst_mapping_error(equal_targets)
+    duration_ms = int(round(duration * 1000))
 
     peak_values = [value for value in peak_map.values() if value > 0]
     rms_values = [value for value in rms_map.values() if value > 0]
@@ -262,10 +356,10 @@ def write_manifest(
     manifest = {
         "version": 4,
         "instrument": "piano",
-        "buildId": int(time.time()),
+        "buildId": 0,
         "source": "University of Iowa MIS Piano (ff)",
         "sourceUrl": SOURCE_BASE_URL,
-        "durationMs": int(round(duration * 1000)),
+        "durationMs": duration_ms,
         "sampleRate": sample_rate,
         "codec": "aac",
         "bitrate": bitrate,
@@ -300,7 +394,7 @@ def write_manifest(
                 "midi": spec.midi,
                 "note": spec.note,
                 "hz": round(spec.hz, 6),
-                "durationMs": int(round(duration * 1000)),
+                "durationMs": duration_ms,
                 "gainApplied": round(gain_map.get(spec.id, 1.0), 6),
                 "file": f"/assets/audio/piano/{spec.output_filename}",
             }
@@ -308,32 +402,16 @@ def write_manifest(
         ],
     }
 
-    (output_dir / "manifest.json").write_text(json.dumps(manifest, indent=2), encoding="utf-8")
-    return manifest
-
-
-def enforce_size_budget(output_dir: Path, target_mb: float, max_total_mb: float) -> tuple[int, float]:
-    audio_files = sorted(output_dir.glob("*.m4a"))
-    total_bytes = sum(path.stat().st_size for path in audio_files)
-    total_mb = total_bytes / (1024 * 1024)
+    manifest["buildId"] = content_build_id(manifest, [output_dir / spec.output_filename for spec in sample_specs])
 
-    if total_mb > max_total_mb:
-        raise SystemExit(
-            f"Audio package is {total_mb:.2f}MB which exceeds hard cap {max_total_mb:.2f}MB",
-        )
-
-    if total_mb > target_mb:
-        print(
-            f"WARNING: audio package is {total_mb:.2f}MB, above target {target_mb:.2f}MB "
-            f"but within hard cap {max_total_mb:.2f}MB",
-        )
-
-    return total_bytes, total_mb
+    with (output_dir / "manifest.json").open("w", encoding="utf-8") as handle:
+        json.dump(manifest, handle, indent=2)
+    return manifest
 
 
 def main() -> None:
     args = parse_args()
-    require_ffmpeg()
+    require_tools("ffmpeg")
 
     output_dir = Path(args.output_dir)
     cache_dir = Path(args.cache_dir)
@@ -341,16 +419,21 @@ def main() -> None:
     if args.clean and output_dir.exists():
         shutil.rmtree(output_dir)
 
+    sample_specs = build_sample_specs()
+
     peak_map, rms_map, gain_map = build_audio_assets(
+        sample_specs=sample_specs,
         output_dir=output_dir,
         cache_dir=cache_dir,
         duration=args.duration,
         sample_rate=args.sample_rate,
         bitrate=args.bitrate,
         refresh_sources=args.refresh_sources,
+        jobs=args.jobs,
     )
 
     manifest = write_manifest(
+        sample_specs=sample_specs,
         output_dir=output_dir,
         duration=args.duration,
         sample_rate=args.sample_rate,
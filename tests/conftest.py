@@ -0,0 +1,15 @@
+import json
+from pathlib import Path
+
+import pytest
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+AUDIO_DIR = REPO_ROOT / "docs" / "assets" / "audio"
+
+
+@pytest.fixture(scope="session")
+def audio_manifests() -> dict[str, dict]:
+    return {
+        instrument: json.loads((AUDIO_DIR / instrument / "manifest.json").read_text(encoding="utf-8"))
+        for instrument in ["piano", "guitar"]
+    }
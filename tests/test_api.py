@@ -24,6 +24,20 @@ def test_get_meta_success():
     assert payload["defaults"]["instrument"] == "piano"
 
 
+def test_get_meta_is_cacheable():
+    response = client.get("/api/v1/meta")
+
+    assert response.status_code == 200
+    assert response.headers["cache-control"] == "public, max-age=300"
+
+
+def test_get_meta_response_schema_is_documented():
+    schema = client.get("/openapi.json").json()
+    content = schema["paths"]["/api/v1/meta"]["get"]["responses"]["200"]["content"]
+
+    assert content["application/json"]["schema"]["type"] == "object"
+
+
 def test_create_session_success():
     response = client.post(
         "/api/v1/session",
@@ -1,4 +1,4 @@
-import json
+from math import log2
 from pathlib import Path
 
 from app.domain.audio_samples import (
@@ -6,6 +6,7 @@ from app.domain.audio_samples import (
     build_sample_specs,
     get_sample_by_id,
     get_unique_equal_temperament_targets,
+    map_target_frequencies,
     map_target_frequency,
     worst_mapping_error,
 )
@@ -16,50 +17,66 @@ REPO_ROOT = Path(__file__).resolve().parents[1]
 PIANO_DIR = REPO_ROOT / "docs" / "assets" / "audio" / "piano"
 GUITAR_DIR = REPO_ROOT / "docs" / "assets" / "audio" / "guitar"
 
+EQUAL_TARGETS = tuple(get_unique_equal_temperament_targets())
+SPECS_BY_INSTRUMENT = {instrument: tuple(build_sample_specs(instrument)) for instrument in ["piano", "guitar"]}
+
 
 def test_equal_temperament_unique_count_matches_expected():
-    equal_targets = get_unique_equal_temperament_targets()
-    piano_specs = build_sample_specs("piano")
-    guitar_specs = build_sample_specs("guitar")
+    piano_specs = SPECS_BY_INSTRUMENT["piano"]
+    guitar_specs = SPECS_BY_INSTRUMENT["guitar"]
 
-    assert len(equal_targets) == 35
+    assert len(EQUAL_TARGETS) == 35
     assert len(piano_specs) == 46
     assert len(guitar_specs) == 46
     assert piano_specs[0].midi == guitar_specs[0].midi == 38
     assert piano_specs[-1].midi == guitar_specs[-1].midi == 83
 
 
-def test_worst_mapping_error_with_sample_pack_stays_under_budget():
+def test_cached_spec_and_target_lists_are_safe_to_mutate():
     equal_targets = get_unique_equal_temperament_targets()
+    piano_specs = build_sample_specs("piano")
+    equal_targets.clear()
+    piano_specs.pop()
 
-    piano_worst_cents, _ = worst_mapping_error(equal_targets, instrument="piano")
-    guitar_worst_cents, _ = worst_mapping_error(equal_targets, instrument="guitar")
+    assert len(get_unique_equal_temperament_targets()) == 35
+    assert len(build_sample_specs("piano")) == 46
+
+
+def test_worst_mapping_error_with_sample_pack_stays_under_budget():
+    piano_worst_cents, _ = worst_mapping_error(list(EQUAL_TARGETS), instrument="piano")
+    guitar_worst_cents, _ = worst_mapping_error(list(EQUAL_TARGETS), instrument="guitar")
 
     assert piano_worst_cents <= MAX_CENTS_ERROR
     assert guitar_worst_cents <= MAX_CENTS_ERROR
 
 
 def test_all_equal_gender_key_targets_map_within_budget_for_each_instrument():
-    combination_count = 0
+    frequencies = []
     for gender in [option["id"] for option in GENDER_OPTIONS]:
         for key in [option["id"] for option in KEY_OPTIONS]:
             do_frequency = calculate_do_frequency(gender=gender, key_id=key)
             for semitone in range(12):
-                frequency = note_frequency(semitone, do_frequency, EQUAL_TEMPERAMENT)
-                piano_mapping = map_target_frequency(frequency, instrument="piano")
-                guitar_mapping = map_target_frequency(frequency, instrument="guitar")
-                assert abs(piano_mapping.cents_error) <= MAX_CENTS_ERROR
-                assert abs(guitar_mapping.cents_error) <= MAX_CENTS_ERROR
-                combination_count += 1
+                frequencies.append(note_frequency(semitone, do_frequency, EQUAL_TEMPERAMENT))
+
+    assert len(frequencies) == 288
+    for instrument in ["piano", "guitar"]:
+        mappings = map_target_frequencies(frequencies, instrument=instrument)
+        assert len(mappings) == 288
+        assert all(abs(mapping.cents_error) <= MAX_CENTS_ERROR for mapping in mappings)
 
-    assert combination_count == 288
 
+def test_map_target_frequency_matches_exhaustive_nearest_sample():
+    for instrument, specs in SPECS_BY_INSTRUMENT.items():
+        targets = [30.0, 2000.0] + [spec.hz for spec in specs]
+        targets += [(low.hz * high.hz) ** 0.5 for low, high in zip(specs, specs[1:])]
+        targets += [spec.hz * 1.01 for spec in specs]
+        for target in targets:
+            expected = min(specs, key=lambda spec: abs(1200 * log2(target / spec.hz)))
+            assert map_target_frequency(target, instrument=instrument).sample_id == expected.id
 
-def _assert_manifest_for_instrument(audio_dir: Path, instrument: str) -> None:
-    manifest_path = audio_dir / "manifest.json"
-    assert manifest_path.exists()
 
-    manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+def _assert_manifest_for_instrument(audio_dir: Path, instrument: str, manifest: dict) -> None:
+    assert (audio_dir / "manifest.json").exists()
     assert manifest["sampleCount"] == 46
     assert manifest["targetFrequencyCount"] == 35
     assert manifest["maxMappingErrorCents"] <= MAX_CENTS_ERROR
@@ -75,16 +92,14 @@ def _assert_manifest_for_instrument(audio_dir: Path, instrument: str) -> None:
     assert total_megabytes < 20.0
 
 
-def test_manifests_exist_and_declare_valid_bounds_for_both_instruments():
-    _assert_manifest_for_instrument(PIANO_DIR, "piano")
-    _assert_manifest_for_instrument(GUITAR_DIR, "guitar")
+def test_manifests_exist_and_declare_valid_bounds_for_both_instruments(audio_manifests):
+    _assert_manifest_for_instrument(PIANO_DIR, "piano", audio_manifests["piano"])
+    _assert_manifest_for_instrument(GUITAR_DIR, "guitar", audio_manifests["guitar"])
 
 
-def test_generated_sessions_use_matching_manifest_sample_ids_for_each_instrument():
-    piano_manifest = json.loads((PIANO_DIR / "manifest.json").read_text(encoding="utf-8"))
-    guitar_manifest = json.loads((GUITAR_DIR / "manifest.json").read_text(encoding="utf-8"))
-    piano_ids = {sample["id"] for sample in piano_manifest["samples"]}
-    guitar_ids = {sample["id"] for sample in guitar_manifest["samples"]}
+def test_generated_sessions_use_matching_manifest_sample_ids_for_each_instrument(audio_manifests):
+    piano_ids = {sample["id"] for sample in audio_manifests["piano"]["samples"]}
+    guitar_ids = {sample["id"] for sample in audio_manifests["guitar"]["samples"]}
 
     modules = [module["id"] for module in get_meta()["modules"]]
 
@@ -0,0 +1,91 @@
+import http.server
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "scripts"))
+
+import _build_common  # noqa: E402
+
+PAYLOADS = {f"/s{i}.aiff": bytes([i]) * (4096 + i) for i in range(4)}
+PROXY_VARS = ("http_proxy", "https_proxy", "all_proxy", "no_proxy")
+
+
+class _KeepAliveHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self.server.client_ports.append(self.client_address[1])
+        body = PAYLOADS[self.path]
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def source_server(monkeypatch):
+    for name in PROXY_VARS:
+        monkeypatch.delenv(name, raising=False)
+        monkeypatch.delenv(name.upper(), raising=False)
+    monkeypatch.setattr(_build_common, "_download_connections", threading.local())
+
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), _KeepAliveHandler)
+    server.client_ports = []
+    thread = threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+    thread.start()
+    yield server, f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def test_fetch_to_file_reuses_one_connection_per_thread(source_server, tmp_path):
+    server, base_url = source_server
+
+    for path, body in PAYLOADS.items():
+        output_path = tmp_path / path.lstrip("/")
+        _build_common.fetch_to_file(base_url + path, output_path)
+        assert output_path.read_bytes() == body
+
+    assert len(server.client_ports) == len(PAYLOADS)
+    assert len(set(server.client_ports)) == 1
+
+
+def test_fetch_to_file_retries_a_dropped_keep_alive_socket(source_server, tmp_path):
+    server, base_url = source_server
+    _build_common.fetch_to_file(f"{base_url}/s0.aiff", tmp_path / "first.aiff")
+
+    connection = _build_common.keep_alive_connection("http", base_url.removeprefix("http://"))
+    connection.sock.close()
+
+    _build_common.fetch_to_file(f"{base_url}/s1.aiff", tmp_path / "second.aiff")
+    assert (tmp_path / "second.aiff").read_bytes() == PAYLOADS["/s1.aiff"]
+    assert len(set(server.client_ports)) == 2
+
+
+def test_fetch_to_file_goes_through_urllib_when_a_proxy_is_configured(source_server, tmp_path, monkeypatch):
+    server, base_url = source_server
+    monkeypatch.setenv("http_proxy", "http://proxy.invalid:3128")
+    calls = []
+    monkeypatch.setattr(_build_common, "urlretrieve", lambda url, path: calls.append(url))
+
+    _build_common.fetch_to_file(f"{base_url}/s0.aiff", tmp_path / "proxied.aiff")
+
+    assert calls == [f"{base_url}/s0.aiff"]
+    assert server.client_ports == []
+
+
+def test_fetch_to_file_connects_directly_for_no_proxy_hosts(source_server, tmp_path, monkeypatch):
+    server, base_url = source_server
+    monkeypatch.setenv("http_proxy", "http://proxy.invalid:3128")
+    monkeypatch.setenv("no_proxy", "127.0.0.1")
+
+    _build_common.fetch_to_file(f"{base_url}/s2.aiff", tmp_path / "direct.aiff")
+
+    assert (tmp_path / "direct.aiff").read_bytes() == PAYLOADS["/s2.aiff"]
+    assert len(server.client_ports) == 1
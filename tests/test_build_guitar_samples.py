@@ -0,0 +1,153 @@
+import struct
+import sys
+from pathlib import Path
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "scripts"))
+
+import build_guitar_samples  # noqa: E402
+
+SAMPLE_RATE = 44100
+FLOAT_SUBFORMAT_GUID = struct.pack("<HHHH6s", 3, 0, 0x10, 0x8000, bytes.fromhex("00aa00389b71"))
+
+
+def _dominant_hz(samples, sample_rate):
+    window = samples * np.hanning(samples.size)
+    padded_length = 32 * samples.size
+    spectrum = np.abs(np.fft.rfft(window, n=padded_length))
+    return np.argmax(spectrum) * sample_rate / padded_length
+
+
+def _extended_rate(rate):
+    exponent = int(np.floor(np.log2(rate)))
+    return struct.pack(">HQ", 16383 + exponent, int(rate * 2 ** (63 - exponent)))
+
+
+def _pcm_aiff(frames, bits, sample_rate=SAMPLE_RATE, channels=1, form_type=b"AIFF"):
+    width = bits // 8
+    data = b"".join(int(value).to_bytes(width, "big", signed=True) for value in frames)
+    comm = struct.pack(">hIh", channels, len(frames) // channels, bits) + _extended_rate(sample_rate)
+    ssnd = struct.pack(">II", 0, 0) + data
+    body = form_type + b"COMM" + struct.pack(">I", len(comm)) + comm + b"SSND" + struct.pack(">I", len(ssnd)) + ssnd
+    return b"FORM" + struct.pack(">I", len(body)) + body
+
+
+def _extensible_float_wav(samples, sample_rate):
+    data = np.asarray(samples, dtype="<f4").tobytes()
+    fmt = struct.pack("<HHIIHHHHI", 0xFFFE, 1, sample_rate, sample_rate * 4, 4, 32, 22, 32, 0x4) + FLOAT_SUBFORMAT_GUID
+    # An odd-sized chunk before "fmt " checks that the RIFF pad byte is skipped.
+    extra = b"LIST" + struct.pack("<I", 3) + b"abc\x00"
+    body = b"WAVE" + extra + b"fmt " + struct.pack("<I", len(fmt)) + fmt + b"data" + struct.pack("<I", len(data)) + data
+    return b"RIFF" + struct.pack("<I", len(body)) + body
+
+
+@pytest.mark.parametrize("semitones", [-12, -2, -1, 1, 2, 12])
+def test_pitch_shift_samples_hits_target_frequency(semitones):
+    source_hz = 220.0
+    length = int(1.5 * SAMPLE_RATE)
+    time = np.arange(length) / SAMPLE_RATE
+    samples = (0.5 * np.sin(2 * np.pi * source_hz * time)).astype(np.float32)
+    ratio = 2 ** (semitones / 12)
+
+    (shifted,) = build_guitar_samples.pitch_shift_samples(samples, [ratio], output_length=length)
+
+    assert shifted.dtype == np.float32
+    assert shifted.size == length
+    steady = shifted[int(0.05 * SAMPLE_RATE) : int(0.65 * SAMPLE_RATE)]
+    assert _dominant_hz(steady, SAMPLE_RATE) == pytest.approx(source_hz * ratio, abs=0.05)
+    if ratio > 1:
+        # Raising the pitch shortens the note; the rest of the fixed-length output stays silent.
+        tail_start = int(np.ceil(length / ratio)) + 1
+        assert np.max(np.abs(shifted[tail_start:])) < 1e-3
+
+
+def test_pitch_shift_samples_shares_one_donor_across_ratios():
+    samples = np.random.default_rng(3).standard_normal(4096).astype(np.float32)
+    ratios = [2 ** (-1 / 12), 1.0, 2 ** (2 / 12)]
+
+    outputs = build_guitar_samples.pitch_shift_samples(samples, ratios, output_length=3000)
+
+    assert [output.size for output in outputs] == [3000, 3000, 3000]
+    np.testing.assert_allclose(outputs[1], samples[:3000], atol=1e-5)
+
+
+def test_float_wav_round_trip(tmp_path):
+    samples = np.linspace(-1.0, 1.0, 1001, dtype=np.float32)
+    path = tmp_path / "donor.wav"
+
+    build_guitar_samples.write_mono_float_wav(path, samples, SAMPLE_RATE)
+    decoded, rate = build_guitar_samples.read_mono_float_wav(path)
+
+    assert rate == SAMPLE_RATE
+    np.testing.assert_array_equal(decoded, samples)
+
+
+def test_read_mono_float_wav_accepts_extensible_header(tmp_path):
+    samples = np.array([0.25, -0.5, 0.75, -1.0], dtype=np.float32)
+    path = tmp_path / "extensible.wav"
+    path.write_bytes(_extensible_float_wav(samples, 48000))
+
+    decoded, rate = build_guitar_samples.read_mono_float_wav(path)
+
+    assert rate == 48000
+    np.testing.assert_array_equal(decoded, samples)
+
+
+def test_read_mono_float_wav_rejects_integer_pcm(tmp_path):
+    data = np.zeros(4, dtype="<i2").tobytes()
+    fmt = struct.pack("<HHIIHH", 1, 1, SAMPLE_RATE, SAMPLE_RATE * 2, 2, 16)
+    body = b"WAVE" + b"fmt " + struct.pack("<I", len(fmt)) + fmt + b"data" + struct.pack("<I", len(data)) + data
+    path = tmp_path / "pcm16.wav"
+    path.write_bytes(b"RIFF" + struct.pack("<I", len(body)) + body)
+
+    with pytest.raises(ValueError, match="32-bit float"):
+        build_guitar_samples.read_mono_float_wav(path)
+
+
+@pytest.mark.parametrize(
+    ("bits", "frames"),
+    [
+        (16, [0, 1, -1, 32767, -32768, 1234]),
+        (24, [0, 1, -1, 8388607, -8388608, -123456]),
+    ],
+)
+def test_read_mono_pcm_aiff_is_exact_for_16_and_24_bit(tmp_path, bits, frames):
+    path = tmp_path / f"pcm{bits}.aif"
+    path.write_bytes(_pcm_aiff(frames, bits))
+
+    decoded, rate = build_guitar_samples.read_mono_pcm_aiff(path)
+
+    assert rate == SAMPLE_RATE
+    assert decoded.dtype == np.float32
+    expected = np.array(frames, dtype=np.float64) / 2 ** (bits - 1)
+    np.testing.assert_array_equal(decoded, expected.astype(np.float32))
+
+
+def test_read_mono_pcm_aiff_32_bit_and_rate(tmp_path):
+    frames = [0, 1, -1, 2**31 - 1, -(2**31), 987654321]
+    path = tmp_path / "pcm32.aif"
+    path.write_bytes(_pcm_aiff(frames, 32, sample_rate=48000))
+
+    decoded, rate = build_guitar_samples.read_mono_pcm_aiff(path)
+
+    assert rate == 48000
+    np.testing.assert_allclose(decoded, np.array(frames, dtype=np.float64) / 2**31, rtol=0, atol=3e-8)
+
+
+@pytest.mark.parametrize(
+    "raw",
+    [
+        _pcm_aiff([0, 1, -1, 2], 16, form_type=b"AIFC"),
+        _pcm_aiff([0, 1, -1, 2], 16, channels=2),
+        _pcm_aiff([0, 1, -1, 2], 8),
+    ],
+    ids=["aifc", "stereo", "8-bit"],
+)
+def test_read_mono_pcm_aiff_returns_none_for_unsupported_files(tmp_path, raw):
+    path = tmp_path / "unsupported.aif"
+    path.write_bytes(raw)
+
+    assert build_guitar_samples.read_mono_pcm_aiff(path) is None
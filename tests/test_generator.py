@@ -23,6 +23,10 @@ def test_meta_contains_expected_module_count_and_structure():
     assert "M4-L6" in module_ids
 
 
+def test_meta_is_built_once():
+    assert get_meta() is get_meta()
+
+
 def test_generate_session_returns_20_questions():
     random.seed(7)
     session = generate_session(
@@ -168,3 +172,19 @@ def test_session_settings_include_requested_instrument():
         instrument="guitar",
     )
     assert session["settings"]["instrument"] == "guitar"
+
+
+def test_questions_do_not_share_note_payload_dicts():
+    random.seed(59)
+    session = generate_session(
+        module_id="MS-L4",
+        gender="male",
+        key="C",
+        temperament="equal_temperament",
+    )
+
+    notes = [question["notes"][0] for question in session["questions"]]
+    assert len({id(note) for note in notes}) == len(notes)
+    enharmonics = [note["enharmonic"] for note in notes if "enharmonic" in note]
+    assert len(enharmonics) > 1
+    assert len({id(enharmonic) for enharmonic in enharmonics}) == len(enharmonics)
@@ -22,6 +22,13 @@ def test_equal_temperament_frequency_formula():
     assert actual == pytest.approx(expected)
 
 
+def test_equal_temperament_frequency_across_octaves():
+    do_frequency = 261.6
+    for semitone in range(-24, 25):
+        expected = do_frequency * math.pow(2, semitone / 12)
+        assert note_frequency(semitone, do_frequency, EQUAL_TEMPERAMENT) == pytest.approx(expected, rel=1e-12)
+
+
 def test_unsupported_temperament_rejected():
     with pytest.raises(ValueError, match="Unsupported temperament"):
         note_frequency(7, 200.0, "just_intonation")